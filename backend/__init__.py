@@ -2,6 +2,9 @@ from .core.vector_store import query_collection, add_to_vector_collection
 from .core.document_processor import process_document
 from .core.llm import re_rank_cross_encoders, call_llm
 from .core.constants import SYSTEM_PROMPT, GREETING_RESPONSES
+from .core.query_log import should_capture, record_query, scrub_pii
+from .core.single_flight import SingleFlight
+from .core.index_store import build_artifact, install_artifact, activate_version, rollback_version
 
 __all__ = [
     'query_collection',
@@ -11,4 +14,12 @@ __all__ = [
     'call_llm',
     'SYSTEM_PROMPT',
     'GREETING_RESPONSES',
+    'should_capture',
+    'record_query',
+    'scrub_pii',
+    'SingleFlight',
+    'build_artifact',
+    'install_artifact',
+    'activate_version',
+    'rollback_version',
 ] 
\ No newline at end of file
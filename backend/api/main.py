@@ -1,16 +1,22 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Request
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 import uvicorn
 import json
 import asyncio
+import hmac
+import os
+import time
 import uuid
 from core.vector_store import query_collection, add_to_vector_collection
 from core.document_processor import process_document
 from core.llm import re_rank_cross_encoders, call_llm
 from core.constants import SYSTEM_PROMPT, GREETING_RESPONSES
+from core.query_log import should_capture, record_query
+from core.single_flight import SingleFlight
+from core.index_store import activate_version, rollback_version, load_active_index, get_index_status, is_artifact_active
 
 app = FastAPI(title="PMAY Chatbot API")
 
@@ -22,6 +28,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+single_flight = SingleFlight()
+
+# Index swaps change what every user is answered from; without a token they are only accepted locally
+ADMIN_TOKEN = os.getenv("PMAY_ADMIN_TOKEN", "")
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+def require_admin(request: Request, x_admin_token: Optional[str] = Header(None)):
+    if ADMIN_TOKEN:
+        if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid or missing admin token")
+    elif request.client is None or request.client.host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Set PMAY_ADMIN_TOKEN to manage the index from other hosts")
+
 class ChatRequest(BaseModel):
     message: str
 
@@ -33,104 +52,166 @@ class DocumentUploadResponse(BaseModel):
     message: str
     chunks_added: int
 
+class IndexActivateRequest(BaseModel):
+    version: str
+
+@app.on_event("startup")
+def load_index():
+    # Serve the prebuilt index artifact recorded as active, if there is one
+    load_active_index()
+
+def elapsed_ms(since: float) -> float:
+    return (time.perf_counter() - since) * 1000
+
+async def generate_response_stream(message: str, trace: dict):
+    """Run the chat pipeline for one message, yielding SSE messages and filling trace."""
+    trace.update({"outcome": "incomplete", "timings_ms": {}, "chunk_ids": []})
+    try:
+        # Removed initial 'Stream started.' message
+        # yield f"data: {json.dumps({'type': 'text', 'content': 'Stream started.'})}\n\n"
+        # print("DEBUG: Initial 'Stream started.' message yielded.")
+
+        user_input_lower = message.lower()
+        if user_input_lower in GREETING_RESPONSES:
+            # Send greeting in SSE format with type 'text'
+            yield f"data: {json.dumps({'type': 'text', 'content': GREETING_RESPONSES[user_input_lower]})}\n\n"
+            print(f"Yielding greeting: {GREETING_RESPONSES[user_input_lower]}")
+            trace["outcome"] = "greeting"
+            return
+
+        # Get documents from vector store
+        stage_started = time.perf_counter()
+        results = query_collection(message)
+        trace["timings_ms"]["retrieve"] = elapsed_ms(stage_started)
+        documents = results.get("documents", [])
+        metadata = results.get("metadatas", []) # Assuming metadata is returned with documents
+        ids = results.get("ids", [])
+
+        print(f"Retrieved {len(documents)} documents from vector store")
+        print("First document sample:", documents[0][:100] if documents else "No documents")
+        
+        if not documents:
+            no_info_response = "I apologize, but I couldn't find specific information about that in my knowledge base. Could you please rephrase your question or ask about a different aspect of PMAY?"
+            # Send no info response in SSE format with type 'text'
+            yield f"data: {json.dumps({'type': 'text', 'content': no_info_response})}\n\n"
+            print(f"Yielding no info: {no_info_response}")
+            trace["outcome"] = "no_results"
+            return
+
+        # Get reranked documents, their indices, and scores
+        stage_started = time.perf_counter()
+        try:
+            relevant_text, relevant_text_ids, relevant_scores = re_rank_cross_encoders(documents, message)
+            print(f"Reranked documents. Got {len(relevant_text_ids)} relevant documents")
+            print("Relevant text sample:", relevant_text[:100] if relevant_text else "No relevant text")
+        except Exception as e:
+            print(f"Error in reranking: {str(e)}")
+            # Fallback to first document if reranking fails
+            relevant_text = documents[0]
+            relevant_text_ids = [0]
+            relevant_scores = [0.5] # Assign a default score for fallback
+        trace["timings_ms"]["rerank"] = elapsed_ms(stage_started)
+        trace["chunk_ids"] = [ids[idx] for idx in relevant_text_ids if idx < len(ids)]
+        
+        if not relevant_text:
+            no_info_response = "I apologize, but I couldn't find specific information about that in my knowledge base. Could you please rephrase your question or ask about a different aspect of PMAY?"
+            # Send no relevant text response in SSE format with type 'text'
+            yield f"data: {json.dumps({'type': 'text', 'content': no_info_response})}\n\n"
+            print(f"Yielding no relevant text: {no_info_response}")
+            trace["outcome"] = "no_results"
+            return
+
+        # Stream the LLM response
+        stage_started = time.perf_counter()
+        async for chunk in call_llm(relevant_text, message, SYSTEM_PROMPT):
+            if "llm_first_token" not in trace["timings_ms"]:
+                trace["timings_ms"]["llm_first_token"] = elapsed_ms(stage_started)
+            # print(f"DEBUG: Processing chunk from LLM: {chunk[:50]}...") # Log first 50 chars of chunk
+            # Send each chunk in SSE format with type 'text'
+            sse_message = f"data: {json.dumps({'type': 'text', 'content': chunk})}\n\n"
+            yield sse_message
+            # print("DEBUG: Yielded SSE text chunk")
+            await asyncio.sleep(0) # Force FastAPI to flush the chunk
+        trace["timings_ms"]["llm"] = elapsed_ms(stage_started)
+        
+        # After streaming is complete, send the sources
+        # print("DEBUG: LLM streaming complete. Preparing sources.")
+        sources = []
+        for idx, score in zip(relevant_text_ids, relevant_scores):
+            if idx < len(metadata):
+                sources.append({
+                    "id": ids[idx] if idx < len(ids) else None,
+                    "text": documents[idx][:200] + "...",  # Truncate long texts
+                    "score": float(score),
+                    "metadata": metadata[idx] if metadata else {}
+                })
+        
+        sse_sources_message = f"data: {json.dumps({'type': 'sources', 'sources': sources})}\n\n"
+        yield sse_sources_message
+        # print("DEBUG: Yielded SSE sources chunk")
+        await asyncio.sleep(0) # Force FastAPI to flush the sources chunk
+        trace["outcome"] = "answer"
+        
+    except Exception as e:
+        print(f"Error in generate_response_stream: {str(e)}")
+        trace["outcome"] = "error"
+        error_message = f"I apologize, but I encountered an error while processing your request: {str(e)}"
+        yield f"data: {json.dumps({'type': 'text', 'content': error_message})}\n\n"
+
 @app.post("/chat")
 async def chat(request: Request):
     try:
         body = await request.body()
-        print("Raw request body:", body)
         try:
             parsed_json = json.loads(body)
-            print("Parsed JSON:", parsed_json)
         except Exception as e:
             print("JSON parse error:", e)
             raise HTTPException(status_code=400, detail="Invalid JSON")
         
-        # Validate against ChatRequest model after raw logging
+        # Validate against ChatRequest model
         try:
             chat_request = ChatRequest(**parsed_json)
         except Exception as e:
-            print(f"ChatRequest validation error: {e}")
+            # Only log field locations: the error text echoes the request body, which may hold PII
+            fields = [".".join(str(part) for part in err.get("loc", ())) for err in e.errors()] if isinstance(e, ValidationError) else []
+            print(f"ChatRequest validation error: {type(e).__name__} on fields {fields}")
             raise HTTPException(status_code=422, detail=f"Validation Error: {e}")
 
-        async def generate_response_stream():
+        # Identical questions already being answered share one pipeline execution.
+        # Whitespace is collapsed before both keying and answering so a shared
+        # execution behaves the same for every subscriber.
+        message = " ".join(chat_request.message.split())
+        flight, joined = single_flight.join(message, lambda trace: generate_response_stream(message, trace))
+        if joined:
+            print(f"Joined in-flight generation ({single_flight.deduplicated} deduplicated so far)")
+
+        # Sampled requests are written to the query capture log once the stream ends
+        capture = should_capture()
+        started = time.perf_counter()
+
+        async def stream_response():
+            subscription = flight.subscribe()
+            first_token_ms = None
             try:
-                # Removed initial 'Stream started.' message
-                # yield f"data: {json.dumps({'type': 'text', 'content': 'Stream started.'})}\n\n"
-                # print("DEBUG: Initial 'Stream started.' message yielded.")
-
-                user_input_lower = chat_request.message.lower()
-                if user_input_lower in GREETING_RESPONSES:
-                    # Send greeting in SSE format with type 'text'
-                    yield f"data: {json.dumps({'type': 'text', 'content': GREETING_RESPONSES[user_input_lower]})}\n\n"
-                    print(f"Yielding greeting: {GREETING_RESPONSES[user_input_lower]}")
-                    return
-
-                # Get documents from vector store
-                results = query_collection(chat_request.message)
-                documents = results.get("documents", [])
-                metadata = results.get("metadatas", []) # Assuming metadata is returned with documents
-
-                print(f"Retrieved {len(documents)} documents from vector store")
-                print("First document sample:", documents[0][:100] if documents else "No documents")
-                
-                if not documents:
-                    no_info_response = "I apologize, but I couldn't find specific information about that in my knowledge base. Could you please rephrase your question or ask about a different aspect of PMAY?"
-                    # Send no info response in SSE format with type 'text'
-                    yield f"data: {json.dumps({'type': 'text', 'content': no_info_response})}\n\n"
-                    print(f"Yielding no info: {no_info_response}")
-                    return
-
-                # Get reranked documents, their indices, and scores
-                try:
-                    relevant_text, relevant_text_ids, relevant_scores = re_rank_cross_encoders(documents, chat_request.message)
-                    print(f"Reranked documents. Got {len(relevant_text_ids)} relevant documents")
-                    print("Relevant text sample:", relevant_text[:100] if relevant_text else "No relevant text")
-                except Exception as e:
-                    print(f"Error in reranking: {str(e)}")
-                    # Fallback to first document if reranking fails
-                    relevant_text = documents[0]
-                    relevant_text_ids = [0]
-                    relevant_scores = [0.5] # Assign a default score for fallback
-                
-                if not relevant_text:
-                    no_info_response = "I apologize, but I couldn't find specific information about that in my knowledge base. Could you please rephrase your question or ask about a different aspect of PMAY?"
-                    # Send no relevant text response in SSE format with type 'text'
-                    yield f"data: {json.dumps({'type': 'text', 'content': no_info_response})}\n\n"
-                    print(f"Yielding no relevant text: {no_info_response}")
-                    return
-
-                # Stream the LLM response
-                async for chunk in call_llm(relevant_text, chat_request.message, SYSTEM_PROMPT):
-                    # print(f"DEBUG: Processing chunk from LLM: {chunk[:50]}...") # Log first 50 chars of chunk
-                    # Send each chunk in SSE format with type 'text'
-                    sse_message = f"data: {json.dumps({'type': 'text', 'content': chunk})}\n\n"
+                async for sse_message in subscription:
+                    # Measured from request arrival, like total, so it is comparable with
+                    # what a client sees; joiners get their own value, not the flight's
+                    if first_token_ms is None:
+                        first_token_ms = elapsed_ms(started)
                     yield sse_message
-                    # print("DEBUG: Yielded SSE text chunk")
-                    await asyncio.sleep(0) # Force FastAPI to flush the chunk
-                
-                # After streaming is complete, send the sources
-                # print("DEBUG: LLM streaming complete. Preparing sources.")
-                sources = []
-                for idx, score in zip(relevant_text_ids, relevant_scores):
-                    if idx < len(metadata):
-                        sources.append({
-                            "text": documents[idx][:200] + "...",  # Truncate long texts
-                            "score": float(score),
-                            "metadata": metadata[idx] if metadata else {}
-                        })
-                
-                sse_sources_message = f"data: {json.dumps({'type': 'sources', 'sources': sources})}\n\n"
-                yield sse_sources_message
-                # print("DEBUG: Yielded SSE sources chunk")
-                await asyncio.sleep(0) # Force FastAPI to flush the sources chunk
-                
-            except Exception as e:
-                print(f"Error in generate_response_stream: {str(e)}")
-                error_message = f"I apologize, but I encountered an error while processing your request: {str(e)}"
-                yield f"data: {json.dumps({'type': 'text', 'content': error_message})}\n\n"
+            finally:
+                # Release this subscriber now; the flight is cancelled when the last one leaves
+                await subscription.aclose()
+                if capture:
+                    trace = flight.trace
+                    timings_ms = dict(trace.get("timings_ms", {}), total=elapsed_ms(started))
+                    if first_token_ms is not None:
+                        timings_ms["first_token"] = first_token_ms
+                    outcome = trace.get("outcome", "incomplete") if flight.done else "incomplete"
+                    record_query(message, outcome, timings_ms, trace.get("chunk_ids", []), coalesced=joined)
 
         return StreamingResponse(
-            generate_response_stream(),
+            stream_response(),
             media_type="text/event-stream"
         )
         
@@ -138,8 +219,38 @@ async def chat(request: Request):
         print(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/stats")
+async def stats():
+    return {"single_flight": single_flight.stats()}
+
+@app.get("/index")
+async def index_status():
+    return get_index_status()
+
+# Sync handlers run in the threadpool, so loading a new index never blocks streaming responses
+@app.post("/index/activate", dependencies=[Depends(require_admin)])
+def activate_index(request: IndexActivateRequest):
+    try:
+        activate_version(request.version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return get_index_status()
+
+@app.post("/index/rollback", dependencies=[Depends(require_admin)])
+def rollback_index():
+    try:
+        rollback_version()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return get_index_status()
+
 @app.post("/upload", response_model=DocumentUploadResponse)
 async def upload_document(file: UploadFile = File(...)):
+    if is_artifact_active():
+        raise HTTPException(
+            status_code=409,
+            detail="Serving a prebuilt index artifact; add the document to docs/ and rebuild with scripts/build_index.py",
+        )
     try:
         content = await file.read()
         splits = process_document(content, file.filename)
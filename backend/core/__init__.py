@@ -2,6 +2,9 @@ from .vector_store import query_collection, add_to_vector_collection
 from .document_processor import process_document
 from .llm import re_rank_cross_encoders, call_llm
 from .constants import SYSTEM_PROMPT, GREETING_RESPONSES
+from .query_log import should_capture, record_query, scrub_pii
+from .single_flight import SingleFlight
+from .index_store import build_artifact, install_artifact, activate_version, rollback_version
 
 __all__ = [
     'query_collection',
@@ -11,4 +14,12 @@ __all__ = [
     'call_llm',
     'SYSTEM_PROMPT',
     'GREETING_RESPONSES',
+    'should_capture',
+    'record_query',
+    'scrub_pii',
+    'SingleFlight',
+    'build_artifact',
+    'install_artifact',
+    'activate_version',
+    'rollback_version',
 ] 
\ No newline at end of file
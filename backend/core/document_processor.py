@@ -5,7 +5,12 @@ from langchain_community.document_loaders import PyMuPDFLoader
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-def process_document(file_content: bytes, filename: str) -> list[Document]:
+def process_document(
+    file_content: bytes,
+    filename: str,
+    chunk_size: int = 1500,
+    chunk_overlap: int = 200,
+) -> list[Document]:
     """Process a document and split it into chunks."""
     if filename.lower().endswith(".pdf"):
         with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
@@ -22,7 +27,7 @@ def process_document(file_content: bytes, filename: str) -> list[Document]:
             doc.metadata["source"] = filename
 
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1500, chunk_overlap=200
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap
         )
         splits = text_splitter.split_documents(documents)
         return splits
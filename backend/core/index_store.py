@@ -0,0 +1,307 @@
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .document_processor import process_document
+from .vector_store import (
+    COLLECTION_NAME,
+    EMBEDDING_MODEL,
+    add_to_vector_collection,
+    get_active_collection,
+    get_vector_collection,
+    make_chunk_ids,
+    release_vector_client,
+    set_active_collection,
+)
+
+# Where a node extracts installed artifacts and records which version is active
+INDEX_ROOT = os.getenv("PMAY_INDEX_ROOT", "./indexes")
+ARTIFACT_FORMAT = 1
+MAX_HISTORY = 10
+
+_swap_lock = threading.Lock()
+_active_version: Optional[str] = None
+
+def sha256_file(path: Path) -> str:
+    """Compute the SHA-256 checksum of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _checksum_tree(directory: Path) -> Dict[str, str]:
+    """Checksum every file below directory, keyed by its relative path."""
+    return {
+        path.relative_to(directory).as_posix(): sha256_file(path)
+        for path in sorted(directory.rglob("*"))
+        if path.is_file() and path.name != "manifest.json"
+    }
+
+def _write_json_atomic(path: Path, data: Dict) -> None:
+    """Write JSON next to path and rename it into place so readers never see a partial file."""
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def build_artifact(
+    docs_dir: str,
+    output_dir: str,
+    version: Optional[str] = None,
+    chunk_size: int = 1500,
+    chunk_overlap: int = 200,
+) -> Path:
+    """
+    Parse and embed every PDF in docs_dir into a versioned, checksummed archive.
+
+    The archive holds the Chroma index, the chunk texts and metadata as JSON
+    lines, and a manifest with the build settings and a checksum per file.
+    """
+    docs = Path(docs_dir)
+    pdf_files = sorted(docs.glob("**/*.pdf"))
+    if not pdf_files:
+        raise ValueError(f"No PDF files found in {docs_dir}")
+
+    sources = {path.relative_to(docs).as_posix(): sha256_file(path) for path in pdf_files}
+    if version is None:
+        corpus_hash = hashlib.sha256(json.dumps(sources, sort_keys=True).encode()).hexdigest()
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{corpus_hash[:8]}"
+
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    archive_path = output / f"pmay-index-{version}.tar.gz"
+    if archive_path.exists():
+        raise ValueError(f"Artifact for version {version} already exists: {archive_path}")
+
+    with tempfile.TemporaryDirectory(prefix="pmay-index-") as staging_dir:
+        staging = Path(staging_dir) / version
+        staging.mkdir()
+        collection = get_vector_collection(path=str(staging / "chroma"))
+
+        chunk_count = 0
+        with open(staging / "chunks.jsonl", "w", encoding="utf-8") as chunks_file:
+            for path in pdf_files:
+                splits = process_document(path.read_bytes(), path.name, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+                if not splits:
+                    print(f"Skipping {path.name}: no text extracted")
+                    continue
+                chunk_count += add_to_vector_collection(splits, path.name, collection=collection)
+                for chunk_id, split in zip(make_chunk_ids(splits, path.name), splits):
+                    chunks_file.write(json.dumps(
+                        {"id": chunk_id, "text": split.page_content, "metadata": split.metadata},
+                        ensure_ascii=False,
+                    ) + "\n")
+                print(f"Indexed {path.name}: {len(splits)} chunks")
+
+        # Close the client before checksumming so Chroma cannot touch the files afterwards
+        release_vector_client(str(staging / "chroma"))
+
+        manifest = {
+            "format": ARTIFACT_FORMAT,
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "collection": COLLECTION_NAME,
+            "embedding_model": EMBEDDING_MODEL,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "chunk_count": chunk_count,
+            "sources": sources,
+            "files": _checksum_tree(staging),
+        }
+        _write_json_atomic(staging / "manifest.json", manifest)
+
+        tmp_archive = output / f".{archive_path.name}.tmp"
+        with tarfile.open(tmp_archive, "w:gz") as tar:
+            tar.add(staging, arcname=version)
+        os.replace(tmp_archive, archive_path)
+
+    archive_path.with_name(archive_path.name + ".sha256").write_text(
+        f"{sha256_file(archive_path)}  {archive_path.name}\n", encoding="utf-8"
+    )
+    return archive_path
+
+def verify_artifact(directory: Path) -> Dict:
+    """Check an extracted artifact against its manifest and return the manifest."""
+    manifest_path = directory / "manifest.json"
+    if not manifest_path.exists():
+        raise ValueError(f"No manifest in {directory}")
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"Unsupported artifact format: {manifest.get('format')}")
+
+    actual = _checksum_tree(directory)
+    expected = manifest.get("files", {})
+    missing = sorted(set(expected) - set(actual))
+    changed = sorted(name for name in expected if name in actual and actual[name] != expected[name])
+    if missing or changed:
+        raise ValueError(f"Artifact {manifest.get('version')} failed verification (missing: {missing}, changed: {changed})")
+    return manifest
+
+def install_artifact(archive_path: str, root: str = INDEX_ROOT) -> str:
+    """
+    Verify an artifact archive and extract it under root, returning its version.
+
+    Chroma writes to its files when opened, so the archive stays the immutable
+    copy and each node serves from its own extracted working copy.
+    """
+    archive = Path(archive_path)
+    checksum_file = archive.with_name(archive.name + ".sha256")
+    if checksum_file.exists():
+        expected = checksum_file.read_text(encoding="utf-8").split()[0]
+        if sha256_file(archive) != expected:
+            raise ValueError(f"Checksum mismatch for {archive}")
+
+    root_dir = Path(root)
+    root_dir.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=".install-", dir=root_dir))
+    try:
+        with tarfile.open(archive, "r:gz") as tar:
+            names = {member.name.split("/")[0] for member in tar.getmembers()}
+            if len(names) != 1:
+                raise ValueError(f"Expected a single version directory in {archive}")
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(staging, filter="data")
+            else:
+                for member in tar.getmembers():
+                    if member.name.startswith("/") or ".." in Path(member.name).parts:
+                        raise ValueError(f"Unsafe path in {archive}: {member.name}")
+                tar.extractall(staging)
+
+        version = names.pop()
+        manifest = verify_artifact(staging / version)
+        if manifest.get("version") != version:
+            raise ValueError(f"Manifest version {manifest.get('version')} does not match directory {version}")
+
+        target = root_dir / version
+        if target.exists():
+            print(f"Index version {version} is already installed")
+        else:
+            os.rename(staging / version, target)
+        return version
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def list_versions(root: str = INDEX_ROOT) -> List[str]:
+    """List installed index versions, oldest first."""
+    root_dir = Path(root)
+    if not root_dir.exists():
+        return []
+    return sorted(p.name for p in root_dir.iterdir() if p.is_dir() and (p / "manifest.json").exists())
+
+def _read_state(root: str) -> Dict:
+    state_path = Path(root) / "active.json"
+    if not state_path.exists():
+        return {"current": None, "history": []}
+    return json.loads(state_path.read_text(encoding="utf-8"))
+
+def _rollback_history(state: Dict) -> List[str]:
+    """History without trailing entries for the version this process already serves."""
+    history = list(state.get("history", []))
+    while history and history[-1] == _active_version:
+        history.pop()
+    return history
+
+def get_index_status(root: str = INDEX_ROOT) -> Dict:
+    """Describe the version this process serves and the versions available to it."""
+    history = _rollback_history(_read_state(root))
+    return {
+        "active": _active_version,
+        "previous": history[-1] if history else None,
+        "installed": list_versions(root),
+    }
+
+def _open_version(version: str, root: str):
+    """Open an installed version's collection and check it is usable before it serves traffic."""
+    # Versions arrive from API requests; only names installed directly under root are accepted
+    if version not in list_versions(root):
+        raise ValueError(f"Index version {version} is not installed in {root}")
+    directory = Path(root) / version
+    manifest_path = directory / "manifest.json"
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    if manifest.get("embedding_model") != EMBEDDING_MODEL:
+        raise ValueError(
+            f"Index version {version} was embedded with {manifest.get('embedding_model')}, "
+            f"but queries use {EMBEDDING_MODEL}"
+        )
+
+    collection = get_vector_collection(path=str(directory / "chroma"), name=manifest.get("collection", COLLECTION_NAME))
+    count = collection.count()
+    if count != manifest.get("chunk_count"):
+        raise ValueError(f"Index version {version} holds {count} chunks, manifest expects {manifest.get('chunk_count')}")
+    return collection
+
+def _serve(version: str, collection, root: str) -> None:
+    global _active_version
+    set_active_collection(collection, path=str(Path(root) / version / "chroma"))
+    _active_version = version
+    print(f"Serving index version {version}")
+
+def activate_version(version: str, root: str = INDEX_ROOT) -> None:
+    """
+    Load an installed version and atomically make it the one served to queries.
+
+    The new collection is fully opened before the swap; queries already past
+    retrieval, including streaming /chat responses, are unaffected. Only this
+    process swaps; every API worker must be activated separately.
+    """
+    with _swap_lock:
+        collection = _open_version(version, root)
+
+        # History records what this process actually served, not what active.json claims
+        state = _read_state(root)
+        if _active_version and _active_version != version:
+            state["history"] = (state.get("history", []) + [_active_version])[-MAX_HISTORY:]
+        state["current"] = version
+        _write_json_atomic(Path(root) / "active.json", state)
+        _serve(version, collection, root)
+
+def rollback_version(root: str = INDEX_ROOT) -> str:
+    """Switch back to the version that was active before the current one."""
+    with _swap_lock:
+        state = _read_state(root)
+        history = _rollback_history(state)
+        if not history:
+            raise ValueError("No previous index version to roll back to")
+        previous = history[-1]
+        collection = _open_version(previous, root)
+
+        state["history"] = history[:-1]
+        state["current"] = previous
+        _write_json_atomic(Path(root) / "active.json", state)
+        _serve(previous, collection, root)
+    return previous
+
+def mark_active(version: str, root: str = INDEX_ROOT) -> None:
+    """Record the version to serve at the next startup without touching rollback history."""
+    if version not in list_versions(root):
+        raise ValueError(f"Index version {version} is not installed in {root}")
+    with _swap_lock:
+        state = _read_state(root)
+        state["current"] = version
+        _write_json_atomic(Path(root) / "active.json", state)
+
+def load_active_index(root: str = INDEX_ROOT) -> Optional[str]:
+    """Serve the version recorded as active under root, if any. Called at startup."""
+    version = _read_state(root).get("current")
+    if not version:
+        print("No index artifact active; serving the local vector store")
+        return None
+    try:
+        with _swap_lock:
+            _serve(version, _open_version(version, root), root)
+    except Exception as e:
+        print(f"Error loading index version {version}: {str(e)}")
+        return None
+    return version
+
+def is_artifact_active() -> bool:
+    """Whether queries are served from a prebuilt index artifact."""
+    return get_active_collection() is not None
@@ -24,7 +24,7 @@ def get_local_cross_encoder():
     
     return model
 
-def re_rank_cross_encoders(documents: List[str], prompt: str) -> Tuple[str, List[int], List[float]]:
+def re_rank_cross_encoders(documents: List[str], prompt: str, top_k: int = 3) -> Tuple[str, List[int], List[float]]:
     """Rerank documents using cross-encoder model."""
     if not documents:
         return "", [], []
@@ -49,8 +49,8 @@ def re_rank_cross_encoders(documents: List[str], prompt: str) -> Tuple[str, List
         # Convert scores to numpy array if it's not already
         scores = np.array(scores)
         
-        # Get top 3 documents
-        top_k = min(3, len(documents))
+        # Get top k documents
+        top_k = min(top_k, len(documents))
         top_indices = np.argsort(scores)[-top_k:][::-1]
         
         # Combine top documents and their indices
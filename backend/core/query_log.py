@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+import random
+import re
+import time
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+# Capture is off unless a log path is configured
+QUERY_LOG_PATH = os.getenv("PMAY_QUERY_LOG_PATH", "")
+QUERY_LOG_SAMPLE_RATE = float(os.getenv("PMAY_QUERY_LOG_SAMPLE_RATE", "0.1"))
+QUERY_LOG_MAX_BYTES = int(os.getenv("PMAY_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+QUERY_LOG_BACKUP_COUNT = int(os.getenv("PMAY_QUERY_LOG_BACKUP_COUNT", "5"))
+
+# Order matters: longer digit runs (cards) must be masked before Aadhaar, and
+# Aadhaar and mobile numbers before the landline and long number patterns
+PII_PATTERNS = [
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "<email>"),
+    (re.compile(r"(?<!\d)\d(?:[\s-]?\d){12,18}(?!\d)"), "<card>"),
+    (re.compile(r"(?<!\d)\d{4}[\s-]?\d{4}[\s-]?\d{4}(?!\d)"), "<aadhaar>"),
+    (re.compile(r"(?<!\d)(?:\+?91[\s-]?)?[6-9]\d{4}[\s-]?\d{5}(?!\d)"), "<phone>"),
+    (re.compile(r"(?<!\d)(?:\+?91[\s-]?|0)[1-9]\d{1,3}[\s-]?\d{3,4}[\s-]?\d{4}(?!\d)"), "<phone>"),
+    (re.compile(r"\b[A-Z]{5}\d{4}[A-Z]\b", re.IGNORECASE), "<pan>"),
+    (re.compile(r"(?<!\d)\d{9,}(?!\d)"), "<number>"),
+]
+
+_logger: Optional[logging.Logger] = None
+
+def _get_logger() -> logging.Logger:
+    """Get the query capture logger, creating its rotating file handler on first use."""
+    global _logger
+    if _logger is None:
+        logger = logging.getLogger("pmay.query_log")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = RotatingFileHandler(
+            QUERY_LOG_PATH,
+            maxBytes=QUERY_LOG_MAX_BYTES,
+            backupCount=QUERY_LOG_BACKUP_COUNT,
+            encoding="utf-8",
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+def scrub_pii(text: str) -> str:
+    """Replace emails, card, Aadhaar, phone, PAN and account-like numbers with placeholders."""
+    for pattern, placeholder in PII_PATTERNS:
+        text = pattern.sub(placeholder, text)
+    return text
+
+def should_capture() -> bool:
+    """Decide whether the current request is sampled for capture."""
+    return bool(QUERY_LOG_PATH) and random.random() < QUERY_LOG_SAMPLE_RATE
+
+def record_query(
+    query: str,
+    outcome: str,
+    timings_ms: Dict[str, float],
+    chunk_ids: List[str],
+    coalesced: bool = False,
+) -> None:
+    """Append one scrubbed query record to the capture log."""
+    try:
+        record = {
+            "ts": round(time.time(), 3),
+            "query": scrub_pii(query),
+            "outcome": outcome,
+            "timings_ms": {stage: round(value, 1) for stage, value in timings_ms.items()},
+            "chunk_ids": chunk_ids,
+            "coalesced": coalesced,
+            "sample_rate": QUERY_LOG_SAMPLE_RATE,
+        }
+        _get_logger().info(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+    except Exception as e:
+        print(f"Error in record_query: {str(e)}")
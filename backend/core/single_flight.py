@@ -0,0 +1,108 @@
+import asyncio
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+class Flight:
+    """A single pipeline execution whose output is shared by every subscriber."""
+
+    def __init__(self, on_abandon: Callable[[], None]):
+        self.trace: Dict = {}
+        self.items: List[str] = []
+        self.done = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._condition = asyncio.Condition()
+        self._on_abandon = on_abandon
+
+    async def _run(self, stream: AsyncIterator[str]) -> None:
+        """Drain the pipeline, buffering every item and waking subscribers."""
+        try:
+            async for item in stream:
+                async with self._condition:
+                    self.items.append(item)
+                    self._condition.notify_all()
+        except Exception as e:
+            print(f"Error in single flight execution: {str(e)}")
+        finally:
+            # Close the pipeline explicitly so a cancelled run releases the LLM stream
+            if hasattr(stream, "aclose"):
+                await stream.aclose()
+            async with self._condition:
+                self.done = True
+                self._condition.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """Yield every item produced so far, then follow the execution until it ends."""
+        index = 0
+        try:
+            while True:
+                async with self._condition:
+                    await self._condition.wait_for(lambda: index < len(self.items) or self.done)
+                    items = self.items[index:]
+                    done = self.done
+                for item in items:
+                    yield item
+                index += len(items)
+                if done and index >= len(self.items):
+                    return
+        finally:
+            self.subscribers -= 1
+            # Stop the pipeline, including the LLM stream, once nobody is listening
+            if self.subscribers == 0 and not self.done:
+                self._on_abandon()
+                if self.task is not None:
+                    self.task.cancel()
+
+class SingleFlight:
+    """Coalesce identical in-flight requests onto one pipeline execution."""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.executions = 0
+        self.deduplicated = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize whitespace and case so only queries the pipeline treats alike share a flight."""
+        return " ".join(query.split()).lower()
+
+    def join(self, query: str, factory: Callable[[Dict], AsyncIterator[str]]) -> Tuple[Flight, bool]:
+        """
+        Attach to the in-flight execution for query, starting one if none is running.
+
+        The factory receives the flight's trace dict and must return the async
+        iterator to execute. Returns the flight and whether an existing one was joined.
+        """
+        key = self.normalize(query)
+        flight = self._flights.get(key)
+        if flight is not None:
+            flight.subscribers += 1
+            self.deduplicated += 1
+            return flight, True
+
+        def forget():
+            # New requests must not join an execution that is being cancelled
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+        flight = Flight(on_abandon=forget)
+        flight.subscribers = 1
+        self._flights[key] = flight
+        self.executions += 1
+
+        async def run():
+            try:
+                await flight._run(factory(flight.trace))
+            finally:
+                # Later requests for the same query start a fresh execution
+                forget()
+
+        flight.task = asyncio.create_task(run())
+        return flight, False
+
+    def stats(self) -> Dict[str, int]:
+        """Return execution and deduplication counters."""
+        return {
+            "executions": self.executions,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self._flights),
+        }
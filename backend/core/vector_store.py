@@ -1,26 +1,95 @@
+import threading
+from typing import Dict, Optional, Set, Tuple
 import chromadb
+from chromadb.api.client import SharedSystemClient
 from chromadb.utils.embedding_functions.ollama_embedding_function import (
     OllamaEmbeddingFunction,
 )
 from langchain_core.documents import Document
 
-def get_vector_collection() -> chromadb.Collection:
+CHROMA_PATH = "./demo-rag-chroma"
+COLLECTION_NAME = "rag_app"
+EMBEDDING_MODEL = "nomic-embed-text:latest"
+
+# Collection served to queries; set when a prebuilt index artifact is activated
+_active_collection: Optional[chromadb.Collection] = None
+_active_path: Optional[str] = None
+# Queries currently using each artifact's client, and swapped-out clients waiting to be released
+_active_lock = threading.Lock()
+_in_use: Dict[str, int] = {}
+_retired: Set[str] = set()
+
+def get_vector_collection(path: str = CHROMA_PATH, name: str = COLLECTION_NAME) -> chromadb.Collection:
     """Get or create the vector collection for document storage."""
     ollama_ef = OllamaEmbeddingFunction(
         url="http://localhost:11434/api/embeddings",
-        model_name="nomic-embed-text:latest",
+        model_name=EMBEDDING_MODEL,
     )
-    chroma_client = chromadb.PersistentClient(path="./demo-rag-chroma")
+    chroma_client = chromadb.PersistentClient(path=path)
     return chroma_client.get_or_create_collection(
-        name="rag_app",
+        name=name,
         embedding_function=ollama_ef,
         metadata={"hnsw:space": "cosine"},
     )
 
-def query_collection(prompt: str, n_results: int = 20):
+def release_vector_client(path: str) -> None:
+    """Stop Chroma's cached client for path so its memory and file handles are freed."""
+    system = SharedSystemClient._identifier_to_system.pop(path, None)
+    if system is not None:
+        system.stop()
+        print(f"Released vector store client for {path}")
+
+def set_active_collection(collection: Optional[chromadb.Collection], path: Optional[str] = None) -> None:
+    """
+    Swap the collection served to queries. In-flight queries keep the one they
+    already hold; the old client is released once the last of them finishes.
+    """
+    global _active_collection, _active_path
+    with _active_lock:
+        old_path = _active_path
+        _active_collection = collection
+        _active_path = path
+        if path is not None:
+            _retired.discard(path)
+        release_now = old_path is not None and old_path != path and not _in_use.get(old_path)
+        if old_path is not None and old_path != path and not release_now:
+            _retired.add(old_path)
+    if release_now:
+        release_vector_client(old_path)
+
+def _acquire_active() -> Tuple[Optional[chromadb.Collection], Optional[str]]:
+    with _active_lock:
+        if _active_path is not None:
+            _in_use[_active_path] = _in_use.get(_active_path, 0) + 1
+        return _active_collection, _active_path
+
+def _release_active(path: str) -> None:
+    with _active_lock:
+        _in_use[path] -= 1
+        release_now = _in_use[path] == 0 and path in _retired
+        if _in_use[path] == 0:
+            del _in_use[path]
+        if release_now:
+            _retired.discard(path)
+    if release_now:
+        release_vector_client(path)
+
+def get_active_collection() -> Optional[chromadb.Collection]:
+    """Get the collection loaded from an index artifact, if one is active."""
+    return _active_collection
+
+def make_chunk_ids(splits: list[Document], collection_name: str) -> list[str]:
+    """Build the IDs under which document splits are stored."""
+    return [f"doc_{collection_name}_{i}" for i in range(len(splits))]
+
+def query_collection(prompt: str, n_results: int = 20, collection: Optional[chromadb.Collection] = None):
     """Query the vector collection for relevant documents."""
+    active_path = None
     try:
-        collection = get_vector_collection()
+        if collection is None:
+            collection, active_path = _acquire_active()
+            if collection is None:
+                collection = get_vector_collection()
         results = collection.query(
             query_texts=[prompt],
             n_results=n_results,
@@ -35,24 +104,33 @@ def query_collection(prompt: str, n_results: int = 20):
             # ChromaDB returns documents as a list of lists, we want just the first list
             documents = results["documents"][0]
             metadatas = results["metadatas"][0] if "metadatas" in results and results["metadatas"] else []
+            ids = results["ids"][0] if "ids" in results and results["ids"] else []
             # Filter out any None or empty documents and ensure they are strings
             documents = [str(doc) for doc in documents if doc]
             print(f"Processed {len(documents)} documents")
-            return {"documents": documents, "metadatas": metadatas}
+            return {"documents": documents, "metadatas": metadatas, "ids": ids}
         
         print("No documents found in results")
-        return {"documents": [], "metadatas": []}
+        return {"documents": [], "metadatas": [], "ids": []}
         
     except Exception as e:
         print(f"Error in query_collection: {str(e)}")
-        return {"documents": [], "metadatas": []}
+        return {"documents": [], "metadatas": [], "ids": []}
+    finally:
+        if active_path is not None:
+            _release_active(active_path)
 
-def add_to_vector_collection(splits: list[Document], collection_name: str) -> int:
+def add_to_vector_collection(
+    splits: list[Document],
+    collection_name: str,
+    collection: Optional[chromadb.Collection] = None,
+) -> int:
     """Add document splits to the vector collection."""
-    collection = get_vector_collection()
+    if collection is None:
+        collection = get_vector_collection()
     collection.add(
         documents=[s.page_content for s in splits],
         metadatas=[s.metadata for s in splits],
-        ids=[f"doc_{collection_name}_{i}" for i in range(len(splits))],
+        ids=make_chunk_ids(splits, collection_name),
     )
     return len(splits) 
\ No newline at end of file
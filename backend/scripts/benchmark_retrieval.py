@@ -0,0 +1,316 @@
+"""
+Offline retrieval benchmark for chunking and top-k settings.
+
+Rebuilds a throwaway index from the PDFs in a docs directory for every
+chunking setting in the grid, runs a labeled question set through retrieval
+and re-ranking, and reports quality and cost per setting.
+
+The labeled set is a JSON list of questions with the pages that answer them
+(pages are 1-based, as shown in a PDF viewer):
+
+    [
+        {
+            "question": "What is the income limit for the EWS category?",
+            "expected": [{"source": "PMAY_Info.pdf", "pages": [3, 4]}]
+        }
+    ]
+
+Requires a running Ollama server for embeddings, same as the API.
+"""
+import argparse
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.constants import SYSTEM_PROMPT
+from core.document_processor import process_document
+from core.llm import re_rank_cross_encoders
+from core.vector_store import add_to_vector_collection, get_vector_collection, query_collection, release_vector_client
+from utils.stats import percentile
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio for English text; good enough to compare settings
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of LLM tokens in a piece of text."""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def load_labeled_set(path: str) -> List[Dict]:
+    """
+    Load the labeled question set.
+
+    Args:
+        path (str): Path to the labeled JSON file
+
+    Returns:
+        List[Dict]: Questions with a set of expected (source, page) pairs
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+
+    questions = []
+    for item in raw:
+        expected: Set[Tuple[str, int]] = set()
+        for ref in item.get('expected', []):
+            for page in ref.get('pages', []):
+                expected.add((ref['source'], int(page)))
+        if not expected:
+            logger.warning(f"Skipping question without expected pages: {item.get('question')}")
+            continue
+        questions.append({'question': item['question'], 'expected': expected})
+    return questions
+
+
+def chunk_page(metadata: Dict) -> Tuple[str, int]:
+    """Return the (source, 1-based page) pair a chunk was cut from."""
+    return metadata.get('source', ''), int(metadata.get('page', -1)) + 1
+
+
+class RetrievalBenchmark:
+    def __init__(self, docs_dir: str, questions: List[Dict]):
+        """
+        Initialize the benchmark.
+
+        Args:
+            docs_dir (str): Directory containing the PDF corpus
+            questions (List[Dict]): Labeled questions from load_labeled_set
+        """
+        self.docs_dir = Path(docs_dir)
+        self.questions = questions
+        self.pdf_files = sorted(self.docs_dir.glob('**/*.pdf'))
+        self.results: List[Dict] = []
+
+    def build_index(self, index_dir: str, chunk_size: int, chunk_overlap: int):
+        """
+        Build a fresh index for one chunking setting.
+
+        Args:
+            index_dir (str): Directory to persist the throwaway index in
+            chunk_size (int): Characters per chunk
+            chunk_overlap (int): Characters shared by neighbouring chunks
+
+        Returns:
+            Tuple of the collection, number of chunks and build time in seconds
+        """
+        start = time.perf_counter()
+        collection = get_vector_collection(path=index_dir)
+        chunk_count = 0
+        for file_path in self.pdf_files:
+            splits = process_document(
+                file_path.read_bytes(),
+                file_path.name,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+            )
+            if splits:
+                chunk_count += add_to_vector_collection(splits, file_path.name, collection=collection)
+        return collection, chunk_count, time.perf_counter() - start
+
+    def rank_questions(self, collection, n_results: int) -> Tuple[List[Dict], List[float]]:
+        """
+        Retrieve and fully re-rank candidates for every question.
+
+        Args:
+            collection: Collection returned by build_index
+            n_results (int): Number of candidates fetched from the vector store
+
+        Returns:
+            Tuple of per-question rankings and per-question latencies in seconds
+        """
+        rankings = []
+        latencies = []
+        for item in self.questions:
+            start = time.perf_counter()
+            results = query_collection(item['question'], n_results=n_results, collection=collection)
+            documents = results.get('documents', [])
+            metadatas = results.get('metadatas', [])
+            # Rank every candidate so any top-k can be evaluated from one pass
+            _, ranked_ids, _ = re_rank_cross_encoders(documents, item['question'], top_k=len(documents))
+            latencies.append(time.perf_counter() - start)
+            rankings.append({
+                'question': item['question'],
+                'expected': item['expected'],
+                'documents': [documents[i] for i in ranked_ids],
+                'pages': [chunk_page(metadatas[i]) if i < len(metadatas) else ('', 0) for i in ranked_ids],
+            })
+        return rankings, latencies
+
+    def score(self, rankings: List[Dict], top_k: int) -> Dict:
+        """
+        Compute recall@k, MRR and prompt size for one top-k setting.
+
+        Args:
+            rankings (List[Dict]): Output of rank_questions
+            top_k (int): Number of re-ranked chunks passed to the LLM
+
+        Returns:
+            Dict: Aggregated metrics over the labeled set
+        """
+        recalls = []
+        reciprocal_ranks = []
+        prompt_tokens = []
+        for ranking in rankings:
+            pages = ranking['pages'][:top_k]
+            expected = ranking['expected']
+            recalls.append(len(expected.intersection(pages)) / len(expected))
+
+            reciprocal_rank = 0.0
+            for rank, page in enumerate(pages, start=1):
+                if page in expected:
+                    reciprocal_rank = 1.0 / rank
+                    break
+            reciprocal_ranks.append(reciprocal_rank)
+
+            # Mirror the context built in re_rank_cross_encoders and the messages sent by call_llm
+            context = "".join(doc + "\n\n" for doc in ranking['documents'][:top_k])
+            prompt_tokens.append(estimate_tokens(
+                f"{SYSTEM_PROMPT}Context: {context}\n\nQuestion: {ranking['question']}"
+            ))
+
+        count = max(1, len(rankings))
+        return {
+            'recall_at_k': sum(recalls) / count,
+            'mrr': sum(reciprocal_ranks) / count,
+            'avg_prompt_tokens': sum(prompt_tokens) / count,
+        }
+
+    def run(self, chunk_sizes: List[int], chunk_overlaps: List[int], n_results_grid: List[int], top_k_grid: List[int]) -> None:
+        """
+        Run the full grid and collect one result row per setting.
+
+        Args:
+            chunk_sizes (List[int]): Chunk sizes to try
+            chunk_overlaps (List[int]): Chunk overlaps to try
+            n_results_grid (List[int]): Vector store candidate counts to try
+            top_k_grid (List[int]): Re-ranked context sizes to try
+        """
+        if not self.pdf_files:
+            logger.error(f"No PDF files found in {self.docs_dir}")
+            return
+
+        logger.info(f"Benchmarking {len(self.questions)} questions against {len(self.pdf_files)} PDF files")
+
+        for chunk_size in chunk_sizes:
+            for chunk_overlap in chunk_overlaps:
+                if chunk_overlap >= chunk_size:
+                    logger.warning(f"Skipping chunk_size={chunk_size}, chunk_overlap={chunk_overlap}: overlap must be smaller than size")
+                    continue
+
+                index_dir = tempfile.mkdtemp(prefix='pmay-bench-')
+                try:
+                    logger.info(f"Building index with chunk_size={chunk_size}, chunk_overlap={chunk_overlap}")
+                    collection, chunk_count, build_time = self.build_index(index_dir, chunk_size, chunk_overlap)
+                    logger.info(f"Indexed {chunk_count} chunks in {build_time:.1f}s")
+
+                    for n_results in n_results_grid:
+                        rankings, latencies = self.rank_questions(collection, n_results)
+                        for top_k in top_k_grid:
+                            if top_k > n_results:
+                                continue
+                            row = {
+                                'chunk_size': chunk_size,
+                                'chunk_overlap': chunk_overlap,
+                                'n_results': n_results,
+                                'top_k': top_k,
+                                'chunk_count': chunk_count,
+                                'build_time_s': build_time,
+                                'latency_mean_ms': 1000 * sum(latencies) / max(1, len(latencies)),
+                                'latency_p95_ms': 1000 * percentile(latencies, 95),
+                            }
+                            row.update(self.score(rankings, top_k))
+                            self.results.append(row)
+                finally:
+                    release_vector_client(index_dir)
+                    shutil.rmtree(index_dir, ignore_errors=True)
+
+    def cheapest(self, min_recall: float) -> Dict:
+        """Return the setting with the smallest prompt that still meets min_recall."""
+        eligible = [row for row in self.results if row['recall_at_k'] >= min_recall]
+        if not eligible:
+            return {}
+        return min(eligible, key=lambda row: (row['avg_prompt_tokens'], row['latency_mean_ms']))
+
+    def print_summary(self, min_recall: float) -> None:
+        """Print a table of all settings and the recommended one."""
+        header = f"{'size':>6} {'overlap':>7} {'n_res':>5} {'top_k':>5} {'chunks':>6} {'build_s':>8} " \
+                 f"{'recall@k':>8} {'mrr':>6} {'lat_ms':>8} {'p95_ms':>8} {'tokens':>7}"
+        logger.info("\nRetrieval Benchmark Summary:")
+        logger.info(header)
+        for row in self.results:
+            logger.info(
+                f"{row['chunk_size']:>6} {row['chunk_overlap']:>7} {row['n_results']:>5} {row['top_k']:>5} "
+                f"{row['chunk_count']:>6} {row['build_time_s']:>8.1f} {row['recall_at_k']:>8.3f} {row['mrr']:>6.3f} "
+                f"{row['latency_mean_ms']:>8.1f} {row['latency_p95_ms']:>8.1f} {row['avg_prompt_tokens']:>7.0f}"
+            )
+
+        best = self.cheapest(min_recall)
+        if best:
+            logger.info(
+                f"\nCheapest setting with recall@k >= {min_recall}: chunk_size={best['chunk_size']}, "
+                f"chunk_overlap={best['chunk_overlap']}, n_results={best['n_results']}, top_k={best['top_k']}"
+            )
+        else:
+            logger.info(f"\nNo setting reached recall@k >= {min_recall}")
+
+
+def parse_int_list(value: str) -> List[int]:
+    """Parse a comma-separated list of integers."""
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def main():
+    """Main function to run the retrieval benchmark."""
+    backend_dir = Path(__file__).parent.parent
+    docs_dir = backend_dir / "docs"
+
+    parser = argparse.ArgumentParser(description='Benchmark retrieval quality and cost across chunking and top-k settings')
+    parser.add_argument('--questions', required=True,
+                      help='Path to the labeled question set (JSON)')
+    parser.add_argument('--docs', default=str(docs_dir),
+                      help=f'Directory containing the PDF corpus (default: {docs_dir})')
+    parser.add_argument('--chunk-sizes', type=parse_int_list, default=[1000, 1500, 2000],
+                      help='Comma-separated chunk sizes to try')
+    parser.add_argument('--chunk-overlaps', type=parse_int_list, default=[100, 200],
+                      help='Comma-separated chunk overlaps to try')
+    parser.add_argument('--n-results', type=parse_int_list, default=[10, 20],
+                      help='Comma-separated vector store candidate counts to try')
+    parser.add_argument('--top-k', type=parse_int_list, default=[2, 3, 5],
+                      help='Comma-separated re-ranked context sizes to try')
+    parser.add_argument('--min-recall', type=float, default=0.8,
+                      help='Recall@k a setting must reach to be recommended')
+    parser.add_argument('--output', help='Optional path to write the results as JSON')
+
+    args = parser.parse_args()
+
+    questions = load_labeled_set(args.questions)
+    if not questions:
+        logger.error(f"No usable questions in {args.questions}")
+        return
+
+    benchmark = RetrievalBenchmark(args.docs, questions)
+    benchmark.run(args.chunk_sizes, args.chunk_overlaps, args.n_results, args.top_k)
+    benchmark.print_summary(args.min_recall)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(benchmark.results, f, indent=2)
+        logger.info(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Build and install versioned index artifacts.
+
+    # Offline, once per corpus change: parse and embed docs/ into an archive
+    python scripts/build_index.py build --docs docs --output artifacts
+
+    # On every node: verify and extract the archive next to the API
+    python scripts/build_index.py install artifacts/pmay-index-<version>.tar.gz
+
+A running API switches to an installed version with POST /index/activate and
+back with POST /index/rollback; each request swaps only the worker process
+that receives it. Passing --activate to install instead marks the version to
+be loaded at the next startup and leaves running workers untouched.
+"""
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from core.index_store import INDEX_ROOT, build_artifact, install_artifact, list_versions, mark_active
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Main function to build or install index artifacts."""
+    import argparse
+
+    backend_dir = Path(__file__).parent.parent
+    docs_dir = backend_dir / "docs"
+
+    parser = argparse.ArgumentParser(description='Build and install versioned index artifacts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Parse and embed PDFs into a versioned artifact')
+    build_parser.add_argument('--docs', default=str(docs_dir),
+                      help=f'Directory containing the PDF corpus (default: {docs_dir})')
+    build_parser.add_argument('--output', default=str(backend_dir / "artifacts"),
+                      help='Directory to write the artifact archive to')
+    build_parser.add_argument('--version', help='Version label (default: build time and corpus hash)')
+    build_parser.add_argument('--chunk-size', type=int, default=1500, help='Characters per chunk')
+    build_parser.add_argument('--chunk-overlap', type=int, default=200, help='Characters shared by neighbouring chunks')
+
+    install_parser = subparsers.add_parser('install', help='Verify and extract an artifact on this node')
+    install_parser.add_argument('archive', help='Path to a pmay-index-<version>.tar.gz artifact')
+    install_parser.add_argument('--root', default=INDEX_ROOT, help=f'Index root directory (default: {INDEX_ROOT})')
+    install_parser.add_argument('--activate', action='store_true',
+                      help='Mark the version to be served at the next API startup')
+
+    list_parser = subparsers.add_parser('list', help='List installed index versions')
+    list_parser.add_argument('--root', default=INDEX_ROOT, help=f'Index root directory (default: {INDEX_ROOT})')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            archive = build_artifact(
+                args.docs,
+                args.output,
+                version=args.version,
+                chunk_size=args.chunk_size,
+                chunk_overlap=args.chunk_overlap,
+            )
+            logger.info(f"Built index artifact {archive}")
+        elif args.command == 'install':
+            version = install_artifact(args.archive, root=args.root)
+            logger.info(f"Installed index version {version} in {args.root}")
+            if args.activate:
+                mark_active(version, root=args.root)
+                logger.info(f"Index version {version} will be served at the next startup")
+        elif args.command == 'list':
+            for version in list_versions(args.root):
+                logger.info(version)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Replay captured chat traffic against a running backend.
+
+Reads the query capture log written when PMAY_QUERY_LOG_PATH is set
+(including its rotated backups), re-sends every query to /chat at the
+original inter-arrival times divided by --speed, and compares latency and
+retrieved chunk IDs with what was captured.
+
+Latency is compared only for queries whose captured outcome was "answer",
+so greetings and "no information" replies do not skew the percentiles. Both
+sides measure first token and total from when the request arrives: captured
+timings start when the server receives the request, replay timings when this
+client sends it, so replay latencies also include network and client time.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.stats import percentile
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def load_capture_log(log_path: str) -> List[Dict]:
+    """
+    Load captured records from a log and its rotated backups, oldest first.
+
+    Args:
+        log_path (str): Path of the active capture log
+
+    Returns:
+        List[Dict]: Captured records sorted by timestamp
+    """
+    path = Path(log_path)
+    backups = sorted(
+        (p for p in path.parent.glob(f"{path.name}.*") if p.suffix[1:].isdigit()),
+        key=lambda p: int(p.suffix[1:]),
+        reverse=True,
+    )
+    records = []
+    for file_path in backups + [path]:
+        if not file_path.exists():
+            continue
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping malformed line in {file_path}")
+    return sorted(records, key=lambda r: r.get('ts', 0))
+
+
+def expand_to_full_load(records: List[Dict]) -> List[Dict]:
+    """
+    Undo capture sampling by repeating each record 1/sample_rate times.
+
+    Copies are spread evenly over the gap to the next captured record so the
+    extra load arrives at the captured rate rather than in bursts.
+
+    Args:
+        records (List[Dict]): Captured records sorted by timestamp
+
+    Returns:
+        List[Dict]: Records with copies, sorted by timestamp
+    """
+    expanded = []
+    for i, record in enumerate(records):
+        copies = max(1, round(1 / record.get('sample_rate', 1.0)))
+        ts = record.get('ts', 0)
+        gap = records[i + 1].get('ts', ts) - ts if i + 1 < len(records) else 0
+        for n in range(copies):
+            expanded.append(dict(record, ts=ts + n * gap / copies))
+    return sorted(expanded, key=lambda r: r.get('ts', 0))
+
+
+class QueryReplayer:
+    def __init__(self, api_url: str = "http://localhost:8000/chat", speed: float = 1.0, max_workers: int = 16, timeout: int = 120):
+        """
+        Initialize the query replayer.
+
+        Args:
+            api_url (str): The URL of the chat endpoint
+            speed (float): Replay rate relative to the captured traffic (2.0 replays twice as fast)
+            max_workers (int): Maximum number of concurrent requests
+            timeout (int): Per-request timeout in seconds
+        """
+        self.api_url = api_url
+        self.speed = speed
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.results: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def send_query(self, record: Dict) -> None:
+        """
+        Send one captured query and record its latency and returned chunk IDs.
+
+        Args:
+            record (Dict): Captured record from the log
+        """
+        result = {
+            'query': record.get('query', ''),
+            'original': record,
+            'first_token_ms': None,
+            'total_ms': None,
+            'chunk_ids': [],
+            'error': None,
+        }
+        start = time.perf_counter()
+        try:
+            with requests.post(self.api_url, json={'message': result['query']}, stream=True, timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    result['error'] = f"Status code {response.status_code}"
+                else:
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith('data: '):
+                            continue
+                        event = json.loads(line[len('data: '):])
+                        if event.get('type') == 'text' and result['first_token_ms'] is None:
+                            result['first_token_ms'] = (time.perf_counter() - start) * 1000
+                        elif event.get('type') == 'sources':
+                            result['chunk_ids'] = [s.get('id') for s in event.get('sources', []) if s.get('id')]
+            result['total_ms'] = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            result['error'] = str(e)
+
+        with self._lock:
+            self.results.append(result)
+
+    def replay(self, records: List[Dict]) -> None:
+        """
+        Replay records, preserving their relative arrival times scaled by speed.
+
+        Args:
+            records (List[Dict]): Captured records sorted by timestamp
+        """
+        if not records:
+            logger.warning("No records to replay")
+            return
+
+        logger.info(f"Replaying {len(records)} queries at {self.speed}x against {self.api_url}")
+        first_ts = records[0].get('ts', 0)
+        replay_start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for record in records:
+                offset = (record.get('ts', first_ts) - first_ts) / self.speed
+                delay = replay_start + offset - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.send_query, record)
+
+    @staticmethod
+    def overlap(original: List[str], replayed: List[str]) -> Optional[float]:
+        """Return the Jaccard overlap of two chunk ID lists, or None if both are empty."""
+        a, b = set(original), set(replayed)
+        if not a and not b:
+            return None
+        return len(a & b) / len(a | b)
+
+    def print_summary(self) -> None:
+        """Print latency and retrieval comparisons between capture and replay."""
+        completed = [r for r in self.results if r['error'] is None]
+        failed = [r for r in self.results if r['error'] is not None]
+        answered = [r for r in completed if r['original'].get('outcome') == 'answer']
+
+        logger.info("\nReplay Summary:")
+        logger.info(f"Total replayed: {len(self.results)}")
+        logger.info(f"Total failed: {len(failed)}")
+
+        logger.info(f"Latency compared over {len(answered)} queries answered at capture time")
+        for label, captured_key, replayed_key in (
+            ('First token', 'first_token', 'first_token_ms'),
+            ('Total', 'total', 'total_ms'),
+        ):
+            captured = [r['original'].get('timings_ms', {}).get(captured_key) for r in answered]
+            captured = [v for v in captured if v is not None]
+            replayed = [r[replayed_key] for r in answered if r[replayed_key] is not None]
+            logger.info(
+                f"{label} latency (ms) captured p50={percentile(captured, 50):.0f} p95={percentile(captured, 95):.0f} | "
+                f"replayed p50={percentile(replayed, 50):.0f} p95={percentile(replayed, 95):.0f}"
+            )
+
+        overlaps = []
+        changed = []
+        for r in completed:
+            value = self.overlap(r['original'].get('chunk_ids', []), r['chunk_ids'])
+            if value is None:
+                continue
+            overlaps.append(value)
+            if value < 1.0:
+                changed.append((value, r['query']))
+
+        if overlaps:
+            logger.info(f"Retrieval: {len(overlaps) - len(changed)}/{len(overlaps)} queries returned identical chunks, "
+                        f"mean overlap {sum(overlaps) / len(overlaps):.3f}")
+        if changed:
+            logger.info("\nMost changed queries:")
+            for value, query in sorted(changed)[:10]:
+                logger.info(f"- {value:.2f} {query}")
+
+        if failed:
+            logger.info("\nFailed queries:")
+            for r in failed[:10]:
+                logger.info(f"- {r['query']}: {r['error']}")
+
+    def write_results(self, output_path: str) -> None:
+        """Write per-query replay results as JSON lines."""
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for r in self.results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        logger.info(f"Results written to {output_path}")
+
+
+def main():
+    """Main function to run the query replayer."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replay captured chat queries against a running backend')
+    parser.add_argument('--log', default=os.getenv('PMAY_QUERY_LOG_PATH', 'query_log.jsonl'),
+                      help='Path of the query capture log (default: $PMAY_QUERY_LOG_PATH)')
+    parser.add_argument('--api-url', default='http://localhost:8000/chat',
+                      help='URL of the chat API endpoint')
+    parser.add_argument('--speed', type=float, default=1.0,
+                      help='Replay rate relative to the captured traffic (2.0 replays twice as fast)')
+    parser.add_argument('--max-workers', type=int, default=16, help='Maximum number of concurrent requests')
+    parser.add_argument('--limit', type=int, help='Only replay the first N captured queries')
+    parser.add_argument('--full-load', action='store_true',
+                      help='Repeat each query 1/sample_rate times to reproduce the unsampled request rate')
+    parser.add_argument('--output', help='Optional path to write per-query results as JSON lines')
+
+    args = parser.parse_args()
+    if args.speed <= 0:
+        logger.error("--speed must be positive")
+        return
+
+    records = load_capture_log(args.log)
+    if args.limit:
+        records = records[:args.limit]
+
+    sample_rates = sorted({r.get('sample_rate') for r in records if r.get('sample_rate')})
+    if sample_rates:
+        logger.info(f"Captured with sample rate(s) {', '.join(str(rate) for rate in sample_rates)}")
+        if args.full_load:
+            records = expand_to_full_load(records)
+        elif any(rate < 1 for rate in sample_rates):
+            logger.info("Replaying the sampled traffic only; pass --full-load to reproduce the original request rate")
+
+    replayer = QueryReplayer(api_url=args.api_url, speed=args.speed, max_workers=args.max_workers)
+    replayer.replay(records)
+    replayer.print_summary()
+
+    if args.output:
+        replayer.write_results(args.output)
+
+if __name__ == "__main__":
+    main()
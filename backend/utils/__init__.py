@@ -1 +1,5 @@
- 
\ No newline at end of file
+from .stats import percentile
+
+__all__ = [
+    'percentile',
+]